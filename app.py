@@ -1,13 +1,12 @@
-from supabase import create_client, Client
+from concurrent.futures import Future, ThreadPoolExecutor
+from supabase import create_client, Client, ClientOptions
 import streamlit as st
 import pandas as pd
-import folium
-from folium import Choropleth
-from streamlit_folium import st_folium
 import altair as alt
 from listing_display import create_column_config, display_gouges_table
-from map_display import display_map_section
+from map_display import create_map_data, display_map_section, selected_map_label
 from gougers_chart import display_gougers_section
+from swr_cache import swr_cache
 
 # ===== Configuration =====
 # These constants define the application's configuration and behavior
@@ -15,219 +14,184 @@ from gougers_chart import display_gougers_section
 # Supabase Configuration
 # URL for the Supabase database instance
 SUPABASE_URL = "https://bntkbculofzofhwzjsps.supabase.co"
+# Seconds to wait for a PostgREST response before giving up
+SUPABASE_TIMEOUT = 30
 
-# Table Display Configuration
-# Controls the visual appearance of data tables
-MAX_TABLE_HEIGHT = 600  # Maximum height for tables in pixels
-MIN_TABLE_HEIGHT = 200  # Minimum height for tables in pixels
-ROW_HEIGHT = 42        # Approximate height per row in pixels
+# Cache Configuration
+# How long cached Supabase reads are served before a background refresh starts
+DATA_CACHE_TTL = 300  # Time-to-live for cached query results in seconds
+# Oldest cached result still served while background refreshes are failing
+DATA_CACHE_MAX_STALE = 3600  # Seconds
 
-# Map Configuration
-# Defines the settings for different geographic views
-# Each entry contains:
-# - table_name: The Supabase table containing the GeoJSON data
-# - col_name: The display name for the region type
-# - location: Default map center coordinates [latitude, longitude]
-# - zoom_start: Initial zoom level for the map
-MAP_CONFIGS = {
-    "Supervisor Districts": {
-        "table_name": "supervisor_geojson",
-        "col_name": "District",
-        "location": [34.32, -118.26],
-        "zoom_start": 9,
-    },
-    "Council Districts": {
-        "table_name": "council_geojson",
-        "col_name": "District",
-        "location": [34.05, -118.4],
-        "zoom_start": 10,
-    },
-    "ZIP Codes": {
-        "table_name": "zipcode_geojson",
-        "col_name": "ZIP Code",
-        "location": [34.32, -118.26],
-        "zoom_start": 9,
-    },
-    "Cities": {
-        "table_name": "city_geojson",
-        "col_name": "City",
-        "location": [34.32, -118.26],
-        "zoom_start": 9,
-    }
-}
+# Table Display Configuration
+# Controls the size of data tables
+EGREGIOUS_GOUGES_LIMIT = 200  # Maximum rows fetched for the egregious gouges table
 
 # ===== Helper Functions =====
 # These functions handle specific tasks and are used throughout the application
 
-def initialize_supabase_client():
+@st.cache_resource(show_spinner=False)
+def initialize_supabase_client() -> Client:
     """Initialize and return Supabase client.
     
     Creates a connection to the Supabase database using the URL and API key.
-    The API key is stored in Streamlit's secrets management.
+    The API key is stored in Streamlit's secrets management. The client is
+    cached as a resource, so a single instance (and its HTTP connection pool)
+    is shared across reruns and sessions.
+    """
+    return create_client(
+        SUPABASE_URL,
+        st.secrets["SUPABASE_KEY"],
+        options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT)
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_fetch_executor():
+    """Return a thread pool for concurrent Supabase reads.
+    
+    Cached as a resource so every rerun and session shares the same worker
+    threads instead of starting and joining new ones each time.
     """
-    return create_client(SUPABASE_URL, st.secrets["SUPABASE_KEY"])
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="supabase-fetch")
 
-@st.cache_data(show_spinner="Loading...")
-def fetch_geojson_data(_supabase_client, table_name):
-    """Fetch and return GeoJSON data from Supabase.
+def submit_fetch(executor, fetch, *args):
+    """Start a cached fetch on the executor, or answer it inline if it's cached.
+    
+    Cache hits never queue on the shared pool, so a session whose data is
+    already cached doesn't wait behind other sessions' cold fetches.
     
     Args:
-        _supabase_client: The Supabase client instance (prefixed with _ to prevent caching)
-        table_name: Name of the table containing the GeoJSON data
+        executor: The shared fetch thread pool
+        fetch: A swr_cache-decorated fetch function
+        *args: Arguments for the fetch function
         
     Returns:
-        The GeoJSON data for the specified table
+        A Future resolving to the fetch function's result
     """
-    response = _supabase_client.table(table_name).select("geojson").execute()
-    return response.data[0]["geojson"]
+    if fetch.is_cached(*args):
+        future = Future()
+        future.set_result(fetch(*args))
+        return future
+    return executor.submit(fetch, *args)
 
-def create_folium_map(location, zoom_start):
-    """Create and return a configured Folium map.
+@swr_cache(ttl=DATA_CACHE_TTL, max_stale=DATA_CACHE_MAX_STALE)
+def fetch_gouged_by_date(_supabase_client):
+    """Fetch and return the gouged listings time series from Supabase.
     
     Args:
-        location: [latitude, longitude] coordinates for the map center
-        zoom_start: Initial zoom level for the map
+        _supabase_client: The Supabase client instance (prefixed with _ to prevent caching)
         
     Returns:
-        A configured Folium map instance
+        A DataFrame with one row per first-gouged date, sorted by date, with
+        the date column already parsed to datetime
     """
-    return folium.Map(
-        location=location,
-        zoom_start=zoom_start,
-        tiles='CartoDB Positron',  # Lightweight map tiles suitable for data visualization
-        control_scale=True,        # Show scale control
-        zoom_control=True,         # Show zoom controls
-        zoom_delta=0.5,            # Fine-grained zoom control
-        max_zoom=20,               # Maximum zoom level
-        min_zoom=7                 # Minimum zoom level
+    response = _supabase_client.table('agg_by_date').select(
+        'first_gouged_price_date, gouged_listings, total_dollars_gouged, cumulative_count'
+    ).order('first_gouged_price_date').execute()
+    df_gouged_by_date = pd.DataFrame(response.data)
+    # PostgREST returns ISO 8601 dates, so use pandas' fast ISO parser
+    df_gouged_by_date['first_gouged_price_date'] = pd.to_datetime(
+        df_gouged_by_date['first_gouged_price_date'], format='ISO8601'
     )
+    return df_gouged_by_date
 
-def create_tooltip(col_name):
-    """Create and return a configured GeoJsonTooltip.
+@swr_cache(ttl=DATA_CACHE_TTL, max_stale=DATA_CACHE_MAX_STALE)
+def fetch_charged_gougers(_supabase_client):
+    """Fetch and return the charged gougers from Supabase.
     
     Args:
-        col_name: The display name for the region type (e.g., "District", "City")
+        _supabase_client: The Supabase client instance (prefixed with _ to prevent caching)
         
     Returns:
-        A configured GeoJsonTooltip instance
+        A DataFrame of gouger names and charge dates, with the date column
+        already parsed to datetime
     """
-    return folium.GeoJsonTooltip(
-        fields=['region', 'gouged_listings'],
-        aliases=[col_name, 'Gouged Listings '],
-        localize=True,
-        sticky=True,
-        labels=True,
-        max_width=600,
-        style="""
-            background-color: #F0EFEF;
-            border: 2px solid black;
-            border-radius: 3px;
-            box-shadow: 3px;
-            padding: 8px;
-            font-size: 14px;
-        """
-    )
+    response = _supabase_client.table('charged_gougers').select('name', 'date_charged').execute()
+    df_charged_gougers = pd.DataFrame(response.data, columns=['name', 'date_charged'])
+    df_charged_gougers['date_charged'] = pd.to_datetime(df_charged_gougers['date_charged'], format='ISO8601')
+    return df_charged_gougers
 
-def prepare_table_data(geojson_data, is_city_data=False):
-    """Prepare and return processed table data.
+@swr_cache(ttl=DATA_CACHE_TTL, max_stale=DATA_CACHE_MAX_STALE)
+def fetch_egregious_gouges(_supabase_client, columns):
+    """Fetch and return the most egregious gouges listings from Supabase.
+    
+    Sorting and limiting happen in the database, so only the rows that
+    will be displayed are transferred.
     
     Args:
-        geojson_data: The GeoJSON data containing region information
-        is_city_data: Boolean indicating if this is city-level data
+        _supabase_client: The Supabase client instance (prefixed with _ to prevent caching)
+        columns: Tuple of column names to select (hashable so it can key the cache)
         
     Returns:
-        A processed DataFrame ready for display
+        A DataFrame with the requested columns, sorted by percent increase
+        (highest first) and capped at EGREGIOUS_GOUGES_LIMIT rows
     """
-    # Convert GeoJSON features to DataFrame
-    table_data = pd.DataFrame([f['properties'] for f in geojson_data['features']])
-    
-    # Special handling for city data
-    if is_city_data:
-        # Convert city names to title case
-        table_data['region'] = table_data['region'].str.title()
-        # Combine "Unincorporated Area" rows and sum their gouged listings
-        table_data = table_data.groupby('region', as_index=False)['gouged_listings'].sum()
-    
-    # Sort by number of gouged listings (highest to lowest)
-    table_data = table_data.sort_values('gouged_listings', ascending=False)
-    return table_data
+    response = (
+        _supabase_client.table('egregious_gouges')
+        .select(','.join(columns))
+        .order('base_vs_latest_price', desc=True, nullsfirst=False)
+        .limit(EGREGIOUS_GOUGES_LIMIT)
+        .execute()
+    )
+    return pd.DataFrame(response.data)
 
-def calculate_table_height(num_rows):
-    """Calculate appropriate table height based on number of rows.
+def summarize_gouged_by_date(df_gouged_by_date, seven_days_ago):
+    """Reduce the time series data to the scalars shown in the metrics row.
     
     Args:
-        num_rows: Number of rows in the table
+        df_gouged_by_date: DataFrame with one row per first-gouged date, sorted by date
+        seven_days_ago: Cutoff date for the "last 7 days" window
         
     Returns:
-        Height in pixels, constrained between MIN_TABLE_HEIGHT and MAX_TABLE_HEIGHT
+        A dict with total, last-7-days and prior gouged listing counts, plus
+        the total dollars gouged
     """
-    return min(max(num_rows * ROW_HEIGHT, MIN_TABLE_HEIGHT), MAX_TABLE_HEIGHT)
-
-# ===== Main Application =====
-def main():
-    """Main application function that sets up and runs the Streamlit dashboard."""
+    # Rows are sorted by date, so the recent window is a tail slice found by binary search
+    recent_start = df_gouged_by_date['first_gouged_price_date'].searchsorted(seven_days_ago, side='right')
+    gouged_listings = df_gouged_by_date['gouged_listings']
+    total_gouged = gouged_listings.sum()
+    last_seven_days = gouged_listings.iloc[recent_start:].sum()
     
-    # Initialize database connection and fetch initial data
-    supabase = initialize_supabase_client()
-    
-    # Load charged_gougers data
-    charged_gougers = supabase.table('charged_gougers').select('name', 'date_charged').execute()
-    df_charged_gougers = pd.DataFrame(charged_gougers.data)
-    
-    # Load and process the time series data
-    gouged_by_date = supabase.table('agg_by_date').select(
-        'first_gouged_price_date, gouged_listings, total_dollars_gouged, cumulative_count'
-    ).execute()
-    df_gouged_by_date = pd.DataFrame(gouged_by_date.data)
-    df_gouged_by_date['first_gouged_price_date'] = pd.to_datetime(df_gouged_by_date['first_gouged_price_date'])
-    total_gouged = df_gouged_by_date['gouged_listings'].sum()
-    last_update_date = max(df_gouged_by_date['first_gouged_price_date'].max() + pd.Timedelta(days=1), pd.Timestamp.now().normalize())
-    last_update_date_str = last_update_date.strftime('%m/%d/%Y')
-    print(last_update_date)
-    # Calculate the date 7 days before the last update
-    seven_days_ago = last_update_date - pd.Timedelta(days=7)
+    return {
+        'total_gouged': total_gouged,
+        'last_seven_days': last_seven_days,
+        'prior_to_seven_days': total_gouged - last_seven_days,
+        'total_dollars_gouged': df_gouged_by_date['total_dollars_gouged'].sum(),
+    }
 
-    # ===== Header and Metrics Section =====
-    # Display key metrics in a three-column layout
-    st.title("Rent Gouging in Los Angeles County")
-    # Get the most recent date from the time series data
-    st.caption(f"Last updated: {last_update_date_str}")
-    r1col1, r1col2, r1col3 = st.columns([1, 1, 1])
+def timeseries_fingerprint(chart_data):
+    """Cheap cache key for the time series chart data.
     
-    # Total gouged listings metric
-    with r1col1:
-        st.metric(label="Total Gouged Listings", value='{:,}'.format(total_gouged))
+    New data always either adds dates or raises the running total, so the row
+    count, latest date and final cumulative count identify it without hashing
+    every value.
     
-    # 7-day trend metric
-    with r1col2:
-        # Calculate recent activity
-        recent_gouged = df_gouged_by_date[df_gouged_by_date['first_gouged_price_date'] > seven_days_ago]
-        last_seven_days = recent_gouged['gouged_listings'].sum()
-        prior_to_seven_days = df_gouged_by_date[df_gouged_by_date['first_gouged_price_date'] <= seven_days_ago]
-        prior_to_seven_days_total = prior_to_seven_days['gouged_listings'].sum()
-        delta_percent = ((total_gouged - prior_to_seven_days_total) / total_gouged) * 100 if prior_to_seven_days_total > 0 else 0
+    Args:
+        chart_data: DataFrame with first_gouged_price_date and cumulative_count columns
         
-        st.metric(
-            label="New Gouges in Last 7 Days", 
-            value=last_seven_days,
-            delta=f"{delta_percent:.1f}% increase",
-            delta_color="inverse"
-        )
-    
-    # Total dollars gouged metric
-    with r1col3:
-        total_dollars_gouged = df_gouged_by_date['total_dollars_gouged'].sum()
-        st.metric(
-            label="Total Dollars Gouged", 
-            value='${:,.2f}MM'.format(total_dollars_gouged / 1000000),
-        )
+    Returns:
+        A tuple identifying the data
+    """
+    return (
+        len(chart_data),
+        chart_data['first_gouged_price_date'].max(),
+        chart_data['cumulative_count'].max(),
+    )
 
-    # ===== Time Series Line Chart =====
-    # Display cumulative gouged listings over time
-    st.header("Rent-Gouged Listings Over Time")
+# Only the current data matters; keep one spare entry while a refresh rolls over
+@st.cache_data(show_spinner=False, max_entries=2, hash_funcs={pd.DataFrame: timeseries_fingerprint})
+def build_timeseries_spec(chart_data):
+    """Build and cache the Vega-Lite spec for the cumulative gouged listings chart.
     
+    Args:
+        chart_data: DataFrame with first_gouged_price_date, gouged_listings
+            and cumulative_count columns
+        
+    Returns:
+        The compiled Vega-Lite spec as a dict, with the data inlined
+    """
     # Create the base chart
-    base = alt.Chart(df_gouged_by_date).encode(
+    base = alt.Chart(chart_data).encode(
         x=alt.X('first_gouged_price_date:T', title='Date')
     )
     
@@ -282,8 +246,79 @@ def main():
         width='container'
     )
     
-    # Display the chart in the first column
-    st.altair_chart(chart, use_container_width=True)
+    return chart.to_dict()
+
+# ===== Main Application =====
+def main():
+    """Main application function that sets up and runs the Streamlit dashboard."""
+    
+    # Initialize database connection and fetch initial data
+    supabase = initialize_supabase_client()
+    
+    # Get the columns to display in the egregious gouges table from the configuration
+    column_config = create_column_config()
+    display_columns = [col for col, config in column_config.items() if config["display"]]
+    
+    # Issue the independent Supabase reads concurrently (each is cached across reruns),
+    # including the map layer that will be shown, so a cold load waits for the
+    # slowest request rather than the sum of all of them. Each section only
+    # waits for its own data, so the metrics don't wait on the map layer.
+    executor = get_fetch_executor()
+    map_label = selected_map_label()
+    charged_gougers_future = submit_fetch(executor, fetch_charged_gougers, supabase)
+    gouged_by_date_future = submit_fetch(executor, fetch_gouged_by_date, supabase)
+    gouges_future = submit_fetch(executor, fetch_egregious_gouges, supabase, tuple(display_columns))
+    map_data_future = submit_fetch(executor, create_map_data, supabase, map_label)
+    
+    df_gouged_by_date = gouged_by_date_future.result()
+    last_update_date = max(df_gouged_by_date['first_gouged_price_date'].max() + pd.Timedelta(days=1), pd.Timestamp.now().normalize())
+    last_update_date_str = last_update_date.strftime('%m/%d/%Y')
+    # Calculate the date 7 days before the last update
+    seven_days_ago = last_update_date - pd.Timedelta(days=7)
+    
+    # Reduce the time series to the headline metrics up front
+    metrics = summarize_gouged_by_date(df_gouged_by_date, seven_days_ago)
+    total_gouged = metrics['total_gouged']
+
+    # ===== Header and Metrics Section =====
+    # Display key metrics in a three-column layout
+    st.title("Rent Gouging in Los Angeles County")
+    # Get the most recent date from the time series data
+    st.caption(f"Last updated: {last_update_date_str}")
+    r1col1, r1col2, r1col3 = st.columns([1, 1, 1])
+    
+    # Total gouged listings metric
+    with r1col1:
+        st.metric(label="Total Gouged Listings", value='{:,}'.format(total_gouged))
+    
+    # 7-day trend metric
+    with r1col2:
+        last_seven_days = metrics['last_seven_days']
+        prior_to_seven_days_total = metrics['prior_to_seven_days']
+        delta_percent = ((total_gouged - prior_to_seven_days_total) / total_gouged) * 100 if prior_to_seven_days_total > 0 else 0
+        
+        st.metric(
+            label="New Gouges in Last 7 Days", 
+            value=last_seven_days,
+            delta=f"{delta_percent:.1f}% increase",
+            delta_color="inverse"
+        )
+    
+    # Total dollars gouged metric
+    with r1col3:
+        total_dollars_gouged = metrics['total_dollars_gouged']
+        st.metric(
+            label="Total Dollars Gouged", 
+            value='${:,.2f}MM'.format(total_dollars_gouged / 1000000),
+        )
+
+    # ===== Time Series Line Chart =====
+    # Display cumulative gouged listings over time
+    st.header("Rent-Gouged Listings Over Time")
+    
+    # Build the chart spec (cached) from only the columns the chart encodes
+    chart_data = df_gouged_by_date[['first_gouged_price_date', 'gouged_listings', 'cumulative_count']]
+    st.vega_lite_chart(build_timeseries_spec(chart_data), use_container_width=True)
 
     # Disable scroll zooming for the line chart to prevent accidental zooming
     st.markdown("""
@@ -295,24 +330,15 @@ def main():
     """, unsafe_allow_html=True)
     
     # ===== Gougers Charged Section =====
-    display_gougers_section(df_charged_gougers, seven_days_ago)
+    display_gougers_section(charged_gougers_future.result(), seven_days_ago)
 
     # ===== Egregious Gouges Table =====
     st.header("Particularly Egregious Gouges")
-    # Get the columns to display from the configuration
-    column_config = create_column_config()
-    display_columns = [col for col, config in column_config.items() if config["display"]]
-    
-    # Fetch the egregious gouges data from Supabase
-    gouges_data = supabase.table('egregious_gouges').select(','.join(display_columns)).execute()
-    df_gouges = pd.DataFrame(gouges_data.data)
-    
-    # Sort and display the table
-    df_gouges = df_gouges.sort_values("base_vs_latest_price", ascending=False)
-    display_gouges_table(df_gouges, column_config)
+    # Display the table (fetched above, already sorted and limited)
+    display_gouges_table(gouges_future.result(), column_config)
 
     # ===== Map Section =====
-    display_map_section(supabase)
+    display_map_section(supabase, map_label, map_data_future)
 
 if __name__ == "__main__":
     main()
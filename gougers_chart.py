@@ -3,16 +3,16 @@ import pandas as pd
 import altair as alt
 
 def display_gougers_section(df_charged_gougers, seven_days_ago):
-    """Display the gougers charged section of the dashboard."""
-    st.header("Enforcement")
+    """Display the gougers charged section of the dashboard.
     
-    # Convert date_charged to datetime if it's not already
-    df_charged_gougers['date_charged'] = pd.to_datetime(df_charged_gougers['date_charged'])
+    Expects date_charged to already be parsed to datetime.
+    """
+    st.header("Enforcement")
     
     # Calculate metrics
     num_charged_gougers = len(df_charged_gougers)
-    recent_charged = df_charged_gougers[df_charged_gougers['date_charged'] > seven_days_ago]
-    num_charged_gougers_recent = len(recent_charged)
+    # Only date_charged is needed here, so count the mask rather than building a filtered frame
+    num_charged_gougers_recent = int((df_charged_gougers['date_charged'] > seven_days_ago).sum())
     
     if num_charged_gougers > 0:
         gougers_delta_percent = (num_charged_gougers_recent / num_charged_gougers) * 100
@@ -38,12 +38,21 @@ def display_gougers_section(df_charged_gougers, seven_days_ago):
     # Create timeline chart
     st.subheader("Gougers Charged Over Time")
     
+    today = pd.Timestamp.now().normalize()
+    st.vega_lite_chart(build_timeline_spec(df_charged_gougers, today), use_container_width=True)
+
+# Keyed on today, so bound it rather than adding an entry every day
+@st.cache_data(show_spinner=False, max_entries=2)
+def build_timeline_spec(df_charged_gougers, today):
+    """Prepare the chart data and build the cached Vega-Lite spec for the gougers timeline.
+    
+    All of the chart's data frames are derived here, so they are only rebuilt
+    when the charged gougers data or the date changes.
+    """
     # Sort by date_charged
-    df_timeline = df_charged_gougers.dropna(subset=['name', 'date_charged']).copy()
-    df_timeline = df_timeline.sort_values('date_charged', ascending=True)
+    df_timeline = df_charged_gougers.dropna(subset=['name', 'date_charged']).sort_values('date_charged', ascending=True)
     
     # Create a dummy point for today
-    today = pd.Timestamp.now().normalize()
     dummy_data = pd.DataFrame({
         'name': [''],
         'date_charged': [today]
@@ -96,10 +105,7 @@ def display_gougers_section(df_charged_gougers, seven_days_ago):
     )
     
     # Create y-axis gridlines
-    y_grid_data = pd.DataFrame({
-        'name': df_timeline['name'].unique(),
-        'date_charged': [df_timeline[df_timeline['name'] == name]['date_charged'].min() for name in df_timeline['name'].unique()]
-    })
+    y_grid_data = df_timeline.groupby('name', sort=False, as_index=False)['date_charged'].min()
     
     y_grid_chart = alt.Chart(y_grid_data).mark_rule(
         color='lightgray',
@@ -151,4 +157,4 @@ def display_gougers_section(df_charged_gougers, seven_days_ago):
         }
     )
     
-    st.altair_chart(chart, use_container_width=True) 
\ No newline at end of file
+    return chart.to_dict()
@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from typing import Dict, TypedDict
 
 class ColumnConfig(TypedDict):
@@ -147,63 +148,58 @@ def create_column_config() -> Dict[str, ColumnConfig]:
         }
     }
 
-def format_value(value, format_type: str, column_name: str = None):
-    """Format a value according to its type."""
-    if pd.isna(value):
-        return value
-    
+def format_column(series: pd.Series, format_type: str, column_name: str = None) -> pd.Series:
+    """Format a column according to its type, leaving missing and unparseable values as-is."""
     if format_type == "date":
-        try:
-            # Convert to datetime and format based on column
-            if column_name == "first_gouged_date":
-                return pd.to_datetime(value).strftime('%b %-d')  # Format like "Jan 1"
-            return pd.to_datetime(value).strftime('%Y-%m-%d')
-        except:
-            return value
+        dates = pd.to_datetime(series, errors="coerce", format="ISO8601")
+        # Format based on column
+        if column_name == "first_gouged_date":
+            formatted = dates.dt.strftime('%b %-d')  # Format like "Jan 1"
+        else:
+            formatted = dates.dt.strftime('%Y-%m-%d')
+        return formatted.where(dates.notna(), series)
     elif format_type == "percent":
-        try:
-            # Convert to percentage with no decimal places (multiply by 100)
-            return f"{float(value) * 100:.0f}%"
-        except:
-            return value
+        # Convert to percentage with no decimal places (multiply by 100)
+        values = pd.to_numeric(series, errors="coerce")
+        return (values * 100).map('{:.0f}%'.format).where(values.notna(), series)
     elif format_type == "currency":
-        try:
-            # Format as currency with commas
-            return f"${float(value):,.0f}"
-        except:
-            return value
+        # Format as currency with commas
+        values = pd.to_numeric(series, errors="coerce")
+        return values.map('${:,.0f}'.format).where(values.notna(), series)
     elif format_type == "text":
         # Special handling for bedrooms column
         if column_name == "bedrooms":
-            return f"{int(value)}BR" if pd.notna(value) else value
+            values = pd.to_numeric(series, errors="coerce")
+            bedrooms = np.trunc(values).astype("Int64").astype(str) + "BR"
+            return bedrooms.where(values.notna(), series)
         # Convert text to title case
-        return str(value).title()
-    return value
+        return series.astype(str).str.title().where(series.notna(), series)
+    return series
 
 def display_gouges_table(df: pd.DataFrame, column_config: Dict[str, ColumnConfig]):
     """Display the gouges data in a Streamlit dataframe with configured columns."""
     # Filter columns based on display configuration
     display_columns = [col for col, config in column_config.items() if config["display"]]
-    df_display = df[display_columns].copy()
     
-    # Format address with city, limiting length
-    df_display["address"] = (df_display["address"].str.lower().str.title() + ", " + df_display["city"].str.lower().str.title())
+    # Format address with city (title-cased once below, as a text column)
+    address = df["address"] + ", " + df["city"]
     
-    # Remove city column since it's now part of address
-    if "city" in df_display.columns:
-        df_display = df_display.drop(columns=["city"])
-    
-    # Reorder columns to put first_gouged_date after Type
+    # Reorder columns to put first_gouged_date after Type, leaving out city
+    # since it's now part of address
     column_order = ['listing_url', 'address', 'bedrooms', 'first_gouged_date']
-    remaining_columns = [col for col in df_display.columns if col not in column_order]
-    df_display = df_display[column_order + remaining_columns]
+    remaining_columns = [col for col in display_columns if col not in column_order and col != "city"]
     
-    # Apply formatting to each column
-    for col in df_display.columns:
+    # Build the display frame from formatted columns (one vectorized operation per
+    # column) rather than copying df and overwriting each column in place
+    formatted = {}
+    for col in column_order + remaining_columns:
         config = column_config[col]
+        column = address if col == "address" else df[col]
         # Apply formatting to all columns except link type
         if config["format_type"] != "link":
-            df_display[col] = df_display[col].apply(lambda x: format_value(x, config["format_type"], col))
+            column = format_column(column, config["format_type"], col)
+        formatted[col] = column
+    df_display = pd.DataFrame(formatted)
     
     # Create column configuration for st.dataframe
     st_column_config = {}
@@ -1,42 +1,135 @@
+import hashlib
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import orjson
 import folium
 from folium import Choropleth
-from streamlit_folium import st_folium
+from shapely.geometry import mapping, shape
+from swr_cache import swr_cache
 
 # Map Configuration
+# Defines the settings for different geographic views
+# Each entry contains:
+# - table_name: The Supabase table containing the GeoJSON data
+# - col_name: The display name for the region type
+# - location: Default map center coordinates [latitude, longitude]
+# - zoom_start: Initial zoom level for the map
+# - simplify_tolerance: Geometry simplification tolerance in degrees. In LA a pixel
+#   covers about 130 km / 2**zoom, so 0.0002 (~20 m) is sub-pixel up to zoom ~12,
+#   0.0001 (~10 m) up to ~13 and 0.00005 (~5 m) up to ~14. Past that, the
+#   simplified outlines (and the slivers between neighbouring features, which
+#   are simplified independently and so differ by at most the tolerance) can
+#   become visible when zoomed in
 MAP_CONFIGS = {
     "Supervisor Districts": {
         "table_name": "supervisor_geojson",
         "col_name": "District",
         "location": [34.32, -118.26],
         "zoom_start": 9,
+        "simplify_tolerance": 0.0002,
     },
     "Council Districts": {
         "table_name": "council_geojson",
         "col_name": "District",
         "location": [34.05, -118.4],
         "zoom_start": 10,
+        "simplify_tolerance": 0.0001,
     },
     "ZIP Codes": {
         "table_name": "zipcode_geojson",
         "col_name": "ZIP Code",
         "location": [34.32, -118.26],
         "zoom_start": 9,
+        "simplify_tolerance": 0.00005,
     },
     "Cities": {
         "table_name": "city_geojson",
         "col_name": "City",
         "location": [34.32, -118.26],
         "zoom_start": 9,
+        "simplify_tolerance": 0.00005,
     }
 }
 
-@st.cache_data(show_spinner=False)
-def fetch_geojson_data(_supabase_client, table_name):
-    """Fetch and cache GeoJSON data from Supabase."""
-    response = _supabase_client.table(table_name).select("geojson").execute()
-    return response.data[0]["geojson"]
+# How long cached map layers are served before a background refresh starts
+MAP_DATA_CACHE_TTL = 3600  # Time-to-live in seconds
+# Oldest layer still served while background refreshes are failing
+MAP_DATA_MAX_STALE = 86400  # Seconds
+
+# GeoJSON Slimming
+# Feature properties the map and table actually read
+FEATURE_PROPERTIES = ('region', 'gouged_listings')
+# Decimal places kept in coordinates (~1 m, sub-pixel up to zoom ~17)
+COORDINATE_PRECISION = 5
+
+def round_coordinates(coordinates, precision):
+    """Round a (possibly nested) GeoJSON coordinate array to the given precision."""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(c, precision) for c in coordinates]
+    if coordinates and coordinates[0] and isinstance(coordinates[0][0], (int, float)):
+        return drop_repeated_positions([round_coordinates(c, precision) for c in coordinates])
+    return [round_coordinates(c, precision) for c in coordinates]
+
+def drop_repeated_positions(positions):
+    """Drop positions that repeat the one before them (e.g. after rounding)."""
+    deduped = [p for i, p in enumerate(positions) if i == 0 or p != positions[i - 1]]
+    # Keep the original if dropping would leave too few positions for a valid ring
+    return deduped if len(deduped) >= 4 else positions
+
+def slim_geometry(geometry, precision, tolerance):
+    """Return a copy of a GeoJSON geometry, simplified and with rounded coordinates."""
+    if geometry is None:
+        return None
+    if tolerance:
+        geometry = mapping(shape(geometry).simplify(tolerance, preserve_topology=True))
+    if geometry['type'] == 'GeometryCollection':
+        return {
+            'type': geometry['type'],
+            'geometries': [slim_geometry(g, precision, None) for g in geometry['geometries']]
+        }
+    return {
+        'type': geometry['type'],
+        'coordinates': round_coordinates(geometry['coordinates'], precision)
+    }
+
+def slim_geojson(geojson_data, tolerance, precision=COORDINATE_PRECISION):
+    """Drop unused feature properties, simplify geometries and round coordinates to shrink the map payload."""
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': slim_geometry(f['geometry'], precision, tolerance),
+                'properties': {k: f['properties'].get(k) for k in FEATURE_PROPERTIES}
+            }
+            for f in geojson_data['features']
+        ]
+    }
+
+def execute_json(query):
+    """Execute a PostgREST query and decode the response body with orjson.
+    
+    Sends the request the query builder would send, but skips the client's
+    stdlib JSON decoding and response model validation, which dominate the
+    cost on large GeoJSON payloads.
+    """
+    response = query.session.request(
+        query.http_method,
+        query.path,
+        params=query.params,
+        headers=query.headers
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def fetch_geojson_data(_supabase_client, table_name, simplify_tolerance):
+    """Fetch GeoJSON data from Supabase (cached through create_map_data)."""
+    # Only the first row is used, so don't transfer any others
+    rows = execute_json(_supabase_client.table(table_name).select("geojson").limit(1))
+    return slim_geojson(rows[0]["geojson"], simplify_tolerance)
 
 def create_folium_map(location, zoom_start):
     """Create and return a configured Folium map."""
@@ -51,6 +144,16 @@ def create_folium_map(location, zoom_start):
         min_zoom=7
     )
 
+# Tooltip style, kept on one line since it is embedded in the map HTML for every layer
+TOOLTIP_STYLE = (
+    "background-color: #F0EFEF; "
+    "border: 2px solid black; "
+    "border-radius: 3px; "
+    "box-shadow: 3px; "
+    "padding: 8px; "
+    "font-size: 14px;"
+)
+
 def create_tooltip(col_name):
     """Create and return a configured GeoJsonTooltip."""
     return folium.GeoJsonTooltip(
@@ -60,26 +163,51 @@ def create_tooltip(col_name):
         sticky=True,
         labels=True,
         max_width=600,
-        style="""
-            background-color: #F0EFEF;
-            border: 2px solid black;
-            border-radius: 3px;
-            box-shadow: 3px;
-            padding: 8px;
-            font-size: 14px;
-        """
+        style=TOOLTIP_STYLE
     )
 
-def prepare_table_data(geojson_data, is_city_data=False):
-    """Prepare and return processed table data."""
-    table_data = pd.DataFrame([f['properties'] for f in geojson_data['features']])
+def build_properties_frame(geojson_data):
+    """Return a DataFrame of the feature properties in the GeoJSON data."""
+    return pd.DataFrame.from_records(f['properties'] for f in geojson_data['features'])
+
+def build_region_values(properties):
+    """Return a region -> gouged listings mapping for coloring the choropleth."""
+    # Zip the raw column arrays rather than walking the feature dicts again
+    return dict(zip(
+        properties['region'].to_numpy(),
+        properties['gouged_listings'].to_numpy()
+    ))
+
+# One entry per layer: a refresh replaces the layer's previous data version
+@st.cache_data(show_spinner=False, max_entries=len(MAP_CONFIGS))
+def prepare_table_data(table_name, data_version, _properties, is_city_data=False):
+    """Prepare, cache and return processed table data from the feature properties.
+    
+    The cache is keyed by table name and data version rather than by hashing
+    the properties frame itself.
+    """
+    table_data = _properties
     
     if is_city_data:
-        table_data['region'] = table_data['region'].str.title()
-        table_data = table_data.groupby('region', as_index=False)['gouged_listings'].sum()
+        # Combine differently-cased rows (e.g. "Unincorporated Area") with vectorized
+        # Arrow kernels, grouping on lowercase names and title-casing only the group keys
+        table = pa.Table.from_pandas(table_data[['region', 'gouged_listings']], preserve_index=False)
+        table = table.filter(pc.is_valid(table['region']))
+        table = table.set_column(0, 'region', pc.utf8_lower(table['region']))
+        # min_count=0 makes an all-null group sum to 0, as pandas' groupby().sum() did
+        table = table.group_by('region').aggregate([
+            ('gouged_listings', 'sum', pc.ScalarAggregateOptions(min_count=0))
+        ])
+        region_index = table.schema.get_field_index('region')
+        table = table.set_column(region_index, 'region', pc.utf8_title(table['region']))
+        table_data = table.to_pandas().rename(columns={'gouged_listings_sum': 'gouged_listings'})
     
-    table_data = table_data.sort_values('gouged_listings', ascending=False)
-    return table_data
+    table_data = table_data.sort_values('gouged_listings', ascending=False, kind='stable')
+    # Explicit dtypes let st.dataframe convert to Arrow without inferring column types
+    return table_data[['region', 'gouged_listings']].astype({
+        'region': 'string[pyarrow]',
+        'gouged_listings': 'Int32'
+    })
 
 def calculate_table_height(num_rows):
     """Calculate appropriate table height based on number of rows."""
@@ -88,72 +216,127 @@ def calculate_table_height(num_rows):
     ROW_HEIGHT = 42
     return min(max(num_rows * ROW_HEIGHT, MIN_TABLE_HEIGHT), MAX_TABLE_HEIGHT)
 
-@st.cache_data(show_spinner=False)
+def geojson_fingerprint(geojson_data):
+    """Return a version key that changes whenever any of a layer's geometries or properties do."""
+    # Computed once per fetch, so hash the full content (serialized with orjson)
+    return hashlib.sha1(orjson.dumps(geojson_data)).hexdigest()
+
+# Bump when the shape of cached layers or the GeoJSON slimming code changes, so
+# layers persisted to disk by older code are never loaded
+MAP_DATA_VERSION = 2
+
+def map_data_persist_key(_supabase_client, selected_label):
+    """Return what else identifies a persisted layer: format version, data source and slimming settings."""
+    return (
+        MAP_DATA_VERSION,
+        _supabase_client.supabase_url,
+        COORDINATE_PRECISION,
+        FEATURE_PROPERTIES,
+        MAP_CONFIGS[selected_label]
+    )
+
+@swr_cache(ttl=MAP_DATA_CACHE_TTL, max_stale=MAP_DATA_MAX_STALE, persist=True, persist_key=map_data_persist_key)
 def create_map_data(_supabase_client, selected_label):
-    """Create and cache map data for the selected label."""
+    """Create and cache map data for the selected label.
+    
+    Cached stale-while-revalidate, so an expired layer is still served
+    immediately while the GeoJSON is refetched in the background. Layers
+    are also persisted to disk, so a restarted server serves them without
+    waiting on Supabase.
+    """
     cfg = MAP_CONFIGS[selected_label]
     
     # Fetch the appropriate GeoJSON data
-    geojson_data = fetch_geojson_data(_supabase_client, cfg["table_name"])
+    geojson_data = fetch_geojson_data(_supabase_client, cfg["table_name"], cfg["simplify_tolerance"])
+    
+    properties = build_properties_frame(geojson_data)
     
     return {
         'geojson_data': geojson_data,
+        'properties': properties,
+        'region_values': build_region_values(properties),
+        'data_version': geojson_fingerprint(geojson_data),
+        'table_name': cfg["table_name"],
         'is_city_data': cfg["table_name"] == 'city_geojson',
         'col_name': cfg["col_name"],
         'location': cfg["location"],
         'zoom_start': cfg["zoom_start"]
     }
 
-def display_map_section(supabase_client):
-    """Display the map section of the dashboard."""
-    st.header("Maps")
+# Bounded like prepare_table_data, so superseded multi-megabyte pages are evicted
+@st.cache_resource(show_spinner=False, max_entries=len(MAP_CONFIGS))
+def build_map_html(selected_label, data_version, _cached_data):
+    """Build the choropleth map for the selected label and cache its rendered HTML.
     
-    selected_label = st.selectbox("View by", list(MAP_CONFIGS.keys()))
+    Cached as a resource: the HTML string is immutable, so every rerun can
+    share it instead of unpickling a fresh copy of a multi-megabyte string.
+    """
+    m = create_folium_map(_cached_data['location'], _cached_data['zoom_start'])
     
-    # Get cached map data
-    cached_data = create_map_data(supabase_client, selected_label)
-    
-    # Create a new map instance
-    m = create_folium_map(cached_data['location'], cached_data['zoom_start'])
-    
-    # Add choropleth layer
-    Choropleth(
-        geo_data=cached_data['geojson_data'],
-        data=pd.DataFrame([f['properties'] for f in cached_data['geojson_data']['features']]),
-        columns=['region', 'gouged_listings'],
+    # Add choropleth layer, drawing the district outlines itself
+    choropleth = Choropleth(
+        geo_data=_cached_data['geojson_data'],
+        data=_cached_data['region_values'],
         key_on="feature.properties.region",
         fill_color="OrRd",
         fill_opacity=0.7,
-        line_opacity=0.2,
+        line_weight=0.5,
         legend_name="Ever Gouged Listings"
     ).add_to(m)
 
-    # Add interactive tooltips
-    tooltip = create_tooltip(cached_data['col_name'])
-    folium.GeoJson(
-        cached_data['geojson_data'],
-        style_function=lambda x: {'fillOpacity': 0, 'color': 'black', 'weight': 0.5},
-        tooltip=tooltip
-    ).add_to(m)
+    # Attach the tooltips to the choropleth's own GeoJSON layer, so the
+    # geometries are embedded in the page and parsed by Leaflet only once
+    create_tooltip(_cached_data['col_name']).add_to(choropleth.geojson)
+    
+    return m.get_root().render()
+
+# Session state key for the map layer selectbox
+MAP_SELECTION_KEY = "map_view"
+
+def selected_map_label():
+    """Return the map layer currently selected (the default before first render)."""
+    return st.session_state.get(MAP_SELECTION_KEY, next(iter(MAP_CONFIGS)))
+
+def display_map_section(supabase_client, prefetched_label, map_data_future):
+    """Display the map section of the dashboard, using the layer prefetched at startup if it's selected."""
+    st.header("Maps")
+    
+    selected_label = st.selectbox("View by", list(MAP_CONFIGS.keys()), key=MAP_SELECTION_KEY)
+    
+    # Get cached map data
+    if selected_label == prefetched_label:
+        cached_data = map_data_future.result()
+    else:
+        cached_data = create_map_data(supabase_client, selected_label)
+    
+    # Get the rendered map, rebuilt only when the layer or its data changes
+    map_html = build_map_html(selected_label, cached_data['data_version'], cached_data)
 
     # Create two-column layout
     r3col1, r3col2 = st.columns([2, 1])
 
     # Display the map
     with r3col1:
-        st_folium(m, use_container_width=True, height=600)
+        components.html(map_html, height=600)
 
     # Display the data table
     with r3col2:
-        table_data = prepare_table_data(cached_data['geojson_data'], cached_data['is_city_data'])
+        table_data = prepare_table_data(
+            cached_data['table_name'],
+            cached_data['data_version'],
+            cached_data['properties'],
+            cached_data['is_city_data']
+        )
         dynamic_height = calculate_table_height(len(table_data))
         
         st.dataframe(
-            table_data[['region', 'gouged_listings']]
-            .rename(columns={
-                'region': cached_data['col_name'],
-                'gouged_listings': 'Gouged Listings'
-            }), 
+            table_data.rename(
+                columns={
+                    'region': cached_data['col_name'],
+                    'gouged_listings': 'Gouged Listings'
+                },
+                copy=False
+            ),
             hide_index=True,
             use_container_width=True,
             height=dynamic_height
@@ -0,0 +1,180 @@
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Background refreshes for every cached function share one small pool
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="swr-refresh")
+
+# Where persisted entries are written, next to Streamlit's own on-disk cache
+PERSIST_DIR = os.path.join(".streamlit", "cache", "swr")
+
+class _CacheState:
+    """Cached entries and in-flight fetches for one decorated function."""
+
+    def __init__(self):
+        self.entries = {}  # key -> (value, fetched_at)
+        self.in_flight = {}  # key -> Future of the fetch currently running
+        self.lock = threading.Lock()
+
+# Streamlit re-executes the main script on every rerun, redefining its
+# decorated functions, so state lives here rather than in each wrapper's
+# closure. Like st.cache_data, it is keyed on the function's module,
+# qualified name and source.
+_states = {}
+_states_lock = threading.Lock()
+
+def _get_state(func, source):
+    with _states_lock:
+        return _states.setdefault((func.__module__, func.__qualname__, source), _CacheState())
+
+def swr_cache(ttl, max_stale, persist=False, persist_key=None):
+    """Cache results process-wide and refresh them stale-while-revalidate.
+
+    The first call for a given key blocks on the wrapped function. Later calls
+    return the cached value immediately; once it is older than ttl seconds a
+    single background refresh is started and its result is served from the
+    next call on. A failed refresh is logged and leaves the stale value in
+    place, so the next call after that retries. Once a value is older than
+    max_stale seconds it is no longer served: the call fetches synchronously
+    and any error propagates to the caller. Only one fetch runs per key at a
+    time; concurrent callers that need the value wait on the running fetch.
+
+    With persist=True every fetched value is also pickled to PERSIST_DIR. After
+    a restart the persisted value is served straight away (aged by its file
+    modification time) instead of blocking on a cold fetch. Persisted entries
+    are keyed on the function's source and its cache key. persist_key, if
+    given, is called with the function's arguments (underscored ones
+    included) and its result is added to that key. Use it for whatever else
+    determines the value, such as the data source or a format version.
+
+    As with st.cache_data, arguments whose names start with an underscore
+    are left out of the cache key. Cached values are shared between
+    sessions, so callers must not mutate them.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        # Like st.cache_data, key entries on the function's source so edits to
+        # it don't serve (or load persisted) values in an outdated shape
+        source = inspect.getsource(func)
+        state = _get_state(func, source)
+        entries = state.entries
+        in_flight = state.in_flight
+        lock = state.lock
+
+        def persist_path(key, args, kwargs):
+            extra = persist_key(*args, **kwargs) if persist_key else None
+            digest = hashlib.sha1((source + repr(extra) + repr(key)).encode()).hexdigest()
+            return os.path.join(PERSIST_DIR, f"{func.__module__}.{func.__qualname__}-{digest}.pickle")
+
+        def load_persisted(key, args, kwargs):
+            path = persist_path(key, args, kwargs)
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                age = time.time() - os.path.getmtime(path)
+            except Exception:
+                # Missing or unreadable files just mean a cold fetch
+                return None
+            return value, time.monotonic() - age
+
+        def save_persisted(key, args, kwargs, value):
+            path = persist_path(key, args, kwargs)
+            # Write to a per-thread temp file and swap it in, so readers never see a partial file
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(PERSIST_DIR, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+        def make_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(
+                (name, value) for name, value in bound.arguments.items()
+                if not name.startswith('_')
+            )
+
+        def start_fetch(key):
+            """Register a fetch for key (call with lock held); return its future and whether the caller runs it."""
+            future = in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = in_flight[key] = Future()
+            return future, True
+
+        def run_fetch(key, future, args, kwargs):
+            try:
+                value = func(*args, **kwargs)
+            except BaseException as e:
+                with lock:
+                    del in_flight[key]
+                future.set_exception(e)
+                raise
+            with lock:
+                entries[key] = (value, time.monotonic())
+                del in_flight[key]
+            future.set_result(value)
+            if persist:
+                save_persisted(key, args, kwargs, value)
+            return value
+
+        def fetch(key, args, kwargs):
+            with lock:
+                future, owner = start_fetch(key)
+            if owner:
+                return run_fetch(key, future, args, kwargs)
+            return future.result()
+
+        def refresh(key, future, args, kwargs):
+            try:
+                run_fetch(key, future, args, kwargs)
+            except Exception:
+                logger.exception("Background refresh of %s failed; serving the stale value", func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            with lock:
+                entry = entries.get(key)
+            if entry is None and persist:
+                entry = load_persisted(key, args, kwargs)
+                if entry is not None:
+                    with lock:
+                        entry = entries.setdefault(key, entry)
+            if entry is None:
+                return fetch(key, args, kwargs)
+
+            age = time.monotonic() - entry[1]
+            if age > max_stale:
+                # Too old to serve (e.g. refreshes keep failing): fetch now and let errors surface
+                return fetch(key, args, kwargs)
+
+            if age > ttl:
+                with lock:
+                    future, owner = start_fetch(key)
+                if owner:
+                    _refresh_executor.submit(refresh, key, future, args, kwargs)
+            return entry[0]
+
+        def is_cached(*args, **kwargs):
+            """Return whether a call would be answered from memory without fetching."""
+            key = make_key(args, kwargs)
+            with lock:
+                entry = entries.get(key)
+            return entry is not None and time.monotonic() - entry[1] <= max_stale
+
+        wrapper.is_cached = is_cached
+        return wrapper
+    return decorator